@@ -1,10 +1,29 @@
 import argparse
+import gc
+import sys
+import threading
+from collections import Counter, OrderedDict
 
-import torch
 from flask import Flask, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 
-from rank_llm.rerank import IdentityReranker, get_azure_openai_args, get_openai_api_key
-from rank_llm.rerank.listwise import RankListwiseOSLLM, SafeOpenai
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from rank_llm.data import Candidate, Query, Request
+from rank_llm.rerank import (
+    IdentityReranker,
+    Reranker,
+    get_azure_openai_args,
+    get_openai_api_key,
+)
 from rank_llm.retrieve import RetrievalMethod, RetrievalMode
 from rank_llm.retrieve_and_rerank import retrieve_and_rerank
 
@@ -17,13 +36,150 @@ Default to 20, 10, None, and 1 respectively
 
 """
 
+# Retrieval methods accepted by the API, keyed by their lowercased query value
+_RETRIEVAL_METHODS = {"bm25": RetrievalMethod.BM25}
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Serializes responses with orjson, deferring unsupported types to Flask."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(
+            obj, default=self.default, option=orjson.OPT_NON_STR_KEYS
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+class _ModelRegistry:
+    """Keeps up to max_models model_coordinators loaded, keyed by model name in
+    LRU order.
+
+    The lock only guards lookups, inserts and evictions. Requests pin the
+    model_coordinator they rerank with, and eviction never drops a pinned
+    one, so a model is neither freed mid-use nor loaded beside max_models
+    others.
+    """
+
+    def __init__(self, max_models, model_coordinator=None):
+        self._max_models = max_models
+        self._model_coordinators = OrderedDict()
+        self._pins = Counter()
+        self._loading = set()
+        self._condition = threading.Condition()
+        if model_coordinator is not None:
+            self._model_coordinators[model_coordinator.get_name()] = model_coordinator
+
+    def acquire(self, model_path, load):
+        """Return the pinned model_coordinator for model_path, calling load to
+        create it if it is not loaded yet. Pair with release().
+        """
+        with self._condition:
+            while True:
+                model_coordinator = self._model_coordinators.get(model_path)
+                if model_coordinator is not None:
+                    self._model_coordinators.move_to_end(model_path)
+                    self._pins[model_path] += 1
+                    return model_coordinator
+                # Concurrent requests for a model being loaded wait for that copy
+                if model_path not in self._loading and self._evict(
+                    self._max_models - 1 - len(self._loading)
+                ):
+                    self._loading.add(model_path)
+                    break
+                self._condition.wait()
+
+        model_coordinator = None
+        try:
+            model_coordinator = load()
+        finally:
+            with self._condition:
+                self._loading.discard(model_path)
+                if model_coordinator is not None:
+                    self._model_coordinators[model_path] = model_coordinator
+                    self._pins[model_path] += 1
+                self._condition.notify_all()
+        return model_coordinator
+
+    def release(self, model_path, model_coordinator):
+        if model_coordinator is None:
+            return
+        with self._condition:
+            self._pins[model_path] -= 1
+            if not self._pins[model_path]:
+                del self._pins[model_path]
+            self._condition.notify_all()
+
+    def _evict(self, max_models):
+        """Drop least recently used unpinned model_coordinators until at most
+        max_models remain, returning whether that bound was reached.
+        """
+        if max_models < 0:
+            return False
+        for model_path in list(self._model_coordinators):
+            if len(self._model_coordinators) <= max_models:
+                break
+            if self._pins[model_path]:
+                continue
+            model_coordinator = self._model_coordinators.pop(model_path)
+            # Only locally hosted models hold CUDA memory worth returning to the
+            # driver, and their module (and torch) is only imported once one is loaded
+            os_llm_module = sys.modules.get(
+                "rank_llm.rerank.listwise.rank_listwise_os_llm"
+            )
+            holds_cuda_memory = os_llm_module is not None and isinstance(
+                model_coordinator, os_llm_module.RankListwiseOSLLM
+            )
+            # Drop the last reference before walking the CUDA caching allocator
+            del model_coordinator
+            gc.collect()
+            if holds_cuda_memory:
+                import torch
+
+                if torch.cuda.is_available():
+                    torch.cuda.synchronize()
+                    torch.cuda.empty_cache()
+        return len(self._model_coordinators) <= max_models
+
+
+def _warm_up_model_coordinator(model_coordinator, num_candidates=20):
+    """Rerank a synthetic full-length window so CUDA kernels, handles and the
+    caching allocator are initialized at their largest shape before serving.
+    """
+    # Passages longer than the prompt budget get truncated by create_prompt,
+    # so the warmup prompt fills the context window like the worst real request
+    passage = " ".join(["warmup"] * 400)
+    request = Request(
+        query=Query(text="warmup query", qid="warmup"),
+        candidates=[
+            Candidate(docid=str(i), score=0.0, doc={"text": passage})
+            for i in range(num_candidates)
+        ],
+    )
+    model_coordinator.rerank_batch(
+        [request], rank_end=num_candidates, window_size=num_candidates
+    )
+    # Only locally hosted models are warmed up, and those have already imported torch
+    import torch
+
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+
+def create_app(model, port, use_azure_openai=False, max_models=1, warmup=False):
+    if max_models < 1:
+        raise ValueError(f"max_models must be at least 1, got {max_models}")
 
-def create_app(model, port, use_azure_openai=False):
     app = Flask(__name__)
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
 
-    global default_model_coordinator
     default_model_coordinator = None
     print(model)
+    # Import backends on demand so API-only deployments never load torch or vLLM
+    if model in ("first_mistral", "rank_zephyr", "rank_vicuna"):
+        from rank_llm.rerank.listwise import RankListwiseOSLLM
     # Load specified model upon server initialization
     if model == "first_mistral":
         print(f"Loading {model} model...")
@@ -69,6 +225,8 @@ def create_app(model, port, use_azure_openai=False):
             window_size=20,
         )
     elif "gpt" in model:
+        from rank_llm.rerank.listwise import SafeOpenai
+
         print(f"Loading {model} model...")
         openai_keys = get_openai_api_key()
         print(openai_keys)
@@ -86,6 +244,12 @@ def create_app(model, port, use_azure_openai=False):
     else:
         raise ValueError(f"Unsupported model: {model}")
 
+    if warmup and model in ("first_mistral", "rank_zephyr", "rank_vicuna"):
+        print(f"Warming up {model} model...")
+        _warm_up_model_coordinator(default_model_coordinator)
+
+    app.config["model_registry"] = _ModelRegistry(max_models, default_model_coordinator)
+
     # Start server
     @app.route(
         "/api/model/<string:model_path>/index/<string:dataset>/<string:retriever_host>",
@@ -100,39 +264,27 @@ def create_app(model, port, use_azure_openai=False):
             - retriever_host (str): host of Anserini API
         """
 
+        args = request.args
         # query to search for
-        query = request.args.get("query", type=str)
+        query = args.get("query")
         # search all of dataset and return top k candidates
-        top_k_retrieve = request.args.get("hits_retriever", default=20, type=int)
+        top_k_retrieve = args.get("hits_retriever", default=20, type=int)
         # rerank top_k_retrieve candidates from retrieve stage and return top_k_rerank candidates
-        top_k_rerank = request.args.get("hits_reranker", default=10, type=int)
+        top_k_rerank = args.get("hits_reranker", default=10, type=int)
         # qid of query
-        qid = request.args.get("qid", default=None, type=str)
+        qid = args.get("qid")
         # number of passes reranker goes through
-        num_passes = request.args.get("num_passes", default=1, type=int)
+        num_passes = args.get("num_passes", default=1, type=int)
         # retrieval method to use
-        retrieval_method = request.args.get(
-            "retrieval_method", default="bm25", type=str
+        _retrieval_method = _RETRIEVAL_METHODS.get(
+            args.get("retrieval_method", default="bm25").lower()
         )
-
-        if "bm25" in retrieval_method.lower():
-            _retrieval_method = RetrievalMethod.BM25
-        else:
+        if _retrieval_method is None:
             return jsonify({"error": str("Retrieval method must be BM25")}), 500
 
-        # If the request model is not the default model
-        global default_model_coordinator
-        if (
-            default_model_coordinator is not None
-            and model_path != default_model_coordinator.get_name()
-        ):
-            # Delete the old model_coordinator to clear up the CUDA cache
-            del default_model_coordinator  # this line is required for clearing the cache
-            torch.cuda.empty_cache()
-            default_model_coordinator = None
-        try:
+        def rerank(model_coordinator):
             # calls Anserini retriever API and reranks
-            (response, model_coordinator) = retrieve_and_rerank(
+            return retrieve_and_rerank(
                 dataset=dataset,
                 retrieval_mode=RetrievalMode.DATASET,
                 query=query,
@@ -143,15 +295,22 @@ def create_app(model, port, use_azure_openai=False):
                 top_k_retrieve=top_k_retrieve,
                 qid=qid,
                 populate_invocations_history=False,
-                default_model_coordinator=default_model_coordinator,
+                default_model_coordinator=model_coordinator,
                 num_passes=num_passes,
                 retrieval_method=_retrieval_method,
                 print_prompts_responses=False,
             )
 
-            # set the default reranking model_coordinator to the most recently used reranking model_coordinator
-            default_model_coordinator = model_coordinator
-
+        model_registry = app.config["model_registry"]
+        try:
+            model_coordinator = model_registry.acquire(
+                model_path,
+                lambda: Reranker.create_model_coordinator(model_path, None, True),
+            )
+            try:
+                (response, _) = rerank(model_coordinator)
+            finally:
+                model_registry.release(model_path, model_coordinator)
             return jsonify(response[0]), 200
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -159,6 +318,35 @@ def create_app(model, port, use_azure_openai=False):
     return app, port
 
 
+def serve(app_factory, port, workers=1, threads=8, worker_class="gthread"):
+    """Serve the app built by app_factory with gunicorn, falling back to Flask's
+    threaded server.
+
+    Each gunicorn worker calls app_factory after it is forked, so CUDA and vLLM
+    are only ever initialized in the process that serves requests. A single
+    worker keeps one model_coordinator in GPU memory while its threads (or
+    greenlets, with ``worker_class="gevent"``) let requests overlap.
+    """
+    if BaseApplication is None:
+        print("gunicorn is not installed, falling back to the Flask server.")
+        app_factory().run(host="0.0.0.0", port=port, debug=False, threaded=True)
+        return
+
+    class StandaloneApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"0.0.0.0:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("worker_class", worker_class)
+            # Model loading can take minutes on first request
+            self.cfg.set("timeout", 0)
+
+        def load(self):
+            return app_factory()
+
+    StandaloneApplication().run()
+
+
 def main():
     parser = argparse.ArgumentParser(description="Start the RankLLM Flask server.")
     parser.add_argument(
@@ -173,10 +361,53 @@ def main():
     parser.add_argument(
         "--use_azure_openai", action="store_true", help="Use Azure OpenAI API."
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of gunicorn worker processes. Each worker loads its own copy of the model after forking.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=8,
+        help="Number of request threads per gunicorn worker.",
+    )
+    parser.add_argument(
+        "--worker_class",
+        type=str,
+        default="gthread",
+        choices=["gthread", "gevent"],
+        help="gunicorn worker class, gevent suits purely I/O bound API rerankers.",
+    )
+    parser.add_argument(
+        "--max_models",
+        type=int,
+        default=1,
+        help="Number of reranking models to keep loaded across requests.",
+    )
+    parser.add_argument(
+        "--no_warmup",
+        action="store_true",
+        help="Skip the warmup rerank of locally hosted models at startup.",
+    )
     args = parser.parse_args()
+    if args.max_models < 1:
+        parser.error("--max_models must be at least 1")
+
+    def app_factory():
+        # Runs in each gunicorn worker after the fork, so every worker warms up
+        # the model it serves
+        app, _ = create_app(
+            args.model,
+            args.port,
+            args.use_azure_openai,
+            args.max_models,
+            warmup=not args.no_warmup,
+        )
+        return app
 
-    app, port = create_app(args.model, args.port, args.use_azure_openai)
-    app.run(host="0.0.0.0", port=port, debug=False)
+    serve(app_factory, args.port, args.workers, args.threads, args.worker_class)
 
 
 if __name__ == "__main__":
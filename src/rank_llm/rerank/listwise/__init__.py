@@ -1,9 +1,15 @@
-from .rank_gemini import SafeGenai
-from .rank_gpt import SafeOpenai
-from .rank_openai import SafeOpenaiBackend
-from .rank_listwise_os_llm import RankListwiseOSLLM
-from .vicuna_reranker import VicunaReranker
-from .zephyr_reranker import ZephyrReranker
+import importlib
+
+# Backends pull in torch, vLLM or API clients, so each one is only imported the
+# first time it is accessed
+_LAZY_IMPORTS = {
+    "SafeGenai": ".rank_gemini",
+    "SafeOpenai": ".rank_gpt",
+    "SafeOpenaiBackend": ".rank_openai",
+    "RankListwiseOSLLM": ".rank_listwise_os_llm",
+    "VicunaReranker": ".vicuna_reranker",
+    "ZephyrReranker": ".zephyr_reranker",
+}
 
 __all__ = [
     "RankListwiseOSLLM",
@@ -13,3 +19,16 @@ __all__ = [
     "SafeOpenaiBackend",
     "SafeGenai",
 ]
+
+
+def __getattr__(name):
+    module = _LAZY_IMPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
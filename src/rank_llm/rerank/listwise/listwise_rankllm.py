@@ -365,7 +365,7 @@ class ListwiseRankLLM(RankLLM, ABC):
             while start_pos >= rank_start:
                 start_pos = max(start_pos, rank_start)
                 prompt, _ = self.create_prompt(result, start_pos, end_pos)
-                input_token_count += self.get_num_tokens(prompt)
+                input_token_count += self.get_num_tokens_cached(prompt)
                 end_pos = end_pos - stride
                 start_pos = start_pos - stride
                 output_token_count += self.num_output_tokens()
@@ -180,7 +180,7 @@ class SafeGenai(ListwiseRankLLM):
                 rank_end=rank_end,
                 max_length=max_length,
             )[-1]["content"]
-            num_tokens = self.get_num_tokens(message)
+            num_tokens = self.get_num_tokens_cached(message)
             if num_tokens <= self.max_tokens() - self.num_output_tokens():
                 break
             else:
@@ -189,7 +189,7 @@ class SafeGenai(ListwiseRankLLM):
                     (num_tokens - self.max_tokens() + self.num_output_tokens())
                     // ((rank_end - rank_start) * 4),
                 )
-        return message, self.get_num_tokens(message)
+        return message, self.get_num_tokens_cached(message)
 
     def num_output_tokens(self, current_window_size: Optional[int] = None) -> int:
         if current_window_size is None:
@@ -93,6 +93,11 @@ class SafeOpenai(ListwiseRankLLM):
             window_size=window_size,
         )
 
+        # Resolve the tokenizer once, unknown models fall back to cl100k_base
+        try:
+            self._encoding = tiktoken.encoding_for_model(self._model)
+        except KeyError:
+            self._encoding = tiktoken.get_encoding("cl100k_base")
         self._output_token_estimate = None
         self._keys = keys
         self._cur_key_id = key_start_id or 0
@@ -199,11 +204,7 @@ class SafeOpenai(ListwiseRankLLM):
             return_text=True,
             **{model_key: self._model},
         )
-        try:
-            encoding = tiktoken.get_encoding(self._model)
-        except:
-            encoding = tiktoken.get_encoding("cl100k_base")
-        return response, len(encoding.encode(response))
+        return response, len(self._encoding.encode(response))
 
     def num_output_tokens(self, current_window_size: Optional[int] = None) -> int:
         if current_window_size is None:
@@ -211,14 +212,9 @@ class SafeOpenai(ListwiseRankLLM):
         if self._output_token_estimate and self._window_size == current_window_size:
             return self._output_token_estimate
         else:
-            try:
-                encoder = tiktoken.get_encoding(self._model)
-            except:
-                encoder = tiktoken.get_encoding("cl100k_base")
-
             _output_token_estimate = (
                 len(
-                    encoder.encode(
+                    self._encoding.encode(
                         " > ".join([f"[{i+1}]" for i in range(current_window_size)])
                     )
                 )
@@ -276,11 +272,7 @@ class SafeOpenai(ListwiseRankLLM):
         else:
             tokens_per_message, tokens_per_name = 0, 0
 
-        try:
-            encoding = tiktoken.get_encoding(self._model)
-        except:
-            encoding = tiktoken.get_encoding("cl100k_base")
-
+        encoding = self._encoding
         num_tokens = 0
         if isinstance(prompt, list):
             for message in prompt:
@@ -51,6 +51,7 @@ class RankListwiseOSLLM(ListwiseRankLLM):
         use_alpha: bool = False,
         sglang_batched: bool = False,
         tensorrt_batched: bool = False,
+        enable_prefix_caching: Optional[bool] = None,
     ) -> None:
         """
          Creates instance of the RankListwiseOSLLM class, an extension of RankLLM designed for performing listwise ranking of passages using a specified language model. Advanced configurations are supported such as GPU acceleration, variable passage handling, and custom system messages for generating prompts.
@@ -76,6 +77,8 @@ class RankListwiseOSLLM(ListwiseRankLLM):
          - use_alpha (bool, optional): Indicates whether to use alphabet ordering the prompts. Defaults to False.
          - sglang_batched (bool, optional): Indicates whether batched inference using SGLang is leveraged. Defaults to False.
          - tensorrt_batched (bool, optional): Indicates whether batched inference using TensorRT-LLM is leveraged. Defaults to False.
+         - enable_prefix_caching (Optional[bool], optional): Indicates whether vLLM reuses KV cache blocks across windows sharing a prompt prefix.
+         Not supported by vLLM's V0 engine for sliding-window models (e.g. Mistral-based rank_zephyr and first_mistral). Defaults to None, which keeps vLLM's own default.
 
          Raises:
          - AssertionError: If CUDA is specified as the device but is not available on the system.
@@ -146,6 +149,7 @@ class RankListwiseOSLLM(ListwiseRankLLM):
                 max_logprobs=30,
                 tensor_parallel_size=num_gpus,
                 gpu_memory_utilization=0.90,
+                enable_prefix_caching=enable_prefix_caching,
             )
             self._tokenizer = self._vllm_handler.get_tokenizer()
 
@@ -352,7 +356,7 @@ class RankListwiseOSLLM(ListwiseRankLLM):
                 enable_thinking=self._is_thinking,
             )
             prompt = fix_text(prompt)
-            num_tokens = self.get_num_tokens(prompt)
+            num_tokens = self.get_num_tokens_cached(prompt)
             if num_tokens <= self.max_tokens() - self.num_output_tokens(
                 rank_end - rank_start
             ):
@@ -367,7 +371,7 @@ class RankListwiseOSLLM(ListwiseRankLLM):
                     )
                     // ((rank_end - rank_start) * 4),
                 )
-        return prompt, self.get_num_tokens(prompt)
+        return prompt, self.get_num_tokens_cached(prompt)
 
     def create_prompt_batched(
         self,
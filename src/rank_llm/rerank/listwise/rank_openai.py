@@ -1,10 +1,15 @@
+import itertools
+import math
+import random
+import threading
 import time
-from enum import Enum
-from typing import Any, Dict, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
+import httpx
 import openai
-from openai import OpenAI
 import tiktoken
+from openai import OpenAI
 from tqdm import tqdm
 
 from rank_llm.data import Request, Result
@@ -12,6 +17,43 @@ from rank_llm.rerank.rankllm import PromptMode
 
 from .listwise_rankllm import ListwiseRankLLM
 
+# Exponential backoff (in seconds) between retries of transient completion errors
+_MAX_RETRIES = 3
+_BACKOFF_BASE = 0.5
+_BACKOFF_CAP = 8.0
+_BACKOFF_JITTER = 0.5
+# Longest server-requested Retry-After honoured before retrying anyway
+_MAX_RETRY_AFTER = _BACKOFF_CAP * 4
+
+# Upper bound on memoized per-message token counts kept by each SafeOpenaiBackend
+_TOKEN_COUNT_CACHE_SIZE = 4096
+# tiktoken's encode_batch starts a new thread pool per call, which only pays off
+# for this many or more uncached messages
+_ENCODE_BATCH_MIN_SIZE = 32
+
+# HTTP clients shared by every SafeOpenaiBackend, keyed by proxy, so that
+# completions reuse keep-alive HTTP/2 connections instead of opening new ones.
+_http_clients: Dict[Optional[str], httpx.Client] = {}
+_http_clients_lock = threading.Lock()
+
+
+def _get_shared_http_client(proxy: Optional[str] = None) -> httpx.Client:
+    with _http_clients_lock:
+        http_client = _http_clients.get(proxy)
+        if http_client is None:
+            http_client = openai.DefaultHttpxClient(
+                proxy=proxy,
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=64,
+                    max_keepalive_connections=32,
+                    keepalive_expiry=60,
+                ),
+            )
+            _http_clients[proxy] = http_client
+        return http_client
+
+
 class SafeOpenaiBackend(ListwiseRankLLM):
     def __init__(
         self,
@@ -27,6 +69,7 @@ class SafeOpenaiBackend(ListwiseRankLLM):
         proxy=None,
         api_base: Optional[str] = None,
         openrouter_config: Optional[Dict[str, str]] = None,
+        max_concurrent_requests: int = 16,
     ) -> None:
         """
         Creates instance of the SafeOpenaiBackend class, a specialized version of RankLLM designed for safely handling OpenAI API calls with
@@ -50,6 +93,8 @@ class SafeOpenaiBackend(ListwiseRankLLM):
         - openrouter_config (Dict[str, str], optional): Configuration for OpenRouter API including:
             - 'site_url': Your site URL for rankings on openrouter.ai (optional)
             - 'site_name': Your site name for rankings on openrouter.ai (optional)
+        - max_concurrent_requests (int, optional): The maximum number of completion requests in flight at once when
+        reranking a batch of requests. Defaults to 16.
 
         Raises:
         - ValueError: If an unsupported prompt mode is provided or if no OpenAI API keys / invalid OpenAI API keys are supplied.
@@ -96,19 +141,38 @@ class SafeOpenaiBackend(ListwiseRankLLM):
             window_size=window_size,
         )
 
-        self._output_token_estimate = None
+        try:
+            self._encoding = tiktoken.encoding_for_model(self._model)
+        except KeyError:
+            self._encoding = tiktoken.get_encoding("cl100k_base")
+        # (tokens_per_message, tokens_per_name) for the legacy chat formats that add
+        # per-message overhead, None for models whose overhead is (0, 0)
+        if self._model in ["gpt-3.5-turbo-0301", "gpt-3.5-turbo"]:
+            # every message follows <|start|>{role/name}\n{content}<|end|>\n, and
+            # if there's a name, the role is omitted
+            self._message_overhead = (4, -1)
+        elif self._model in ["gpt-4-0314", "gpt-4"]:
+            self._message_overhead = (3, 1)
+        else:
+            self._message_overhead = None
+        # System, few-shot, and query messages repeat across every window of a
+        # request, so their token counts are memoized by message text.
+        self._token_count_cache: Dict[str, int] = {}
+        # Every window in a sliding window pass is at most window_size candidates long
+        self._output_token_table = {
+            window_size: self._estimate_output_tokens(window_size)
+            for window_size in range(1, self._window_size + 1)
+        }
         self._keys = keys
         self._cur_key_id = key_start_id or 0
         self._cur_key_id = self._cur_key_id % len(self._keys)
         self.openrouter_config = openrouter_config or {}
+        self._max_concurrent_requests = max_concurrent_requests
         
         # Initialize OpenAI client
         client_kwargs = {
-            "api_key": self._keys[self._cur_key_id]
+            "http_client": _get_shared_http_client(proxy),
         }
-        
-        if proxy:
-            client_kwargs["http_client"] = openai.DefaultHttpxClient(proxies=proxy)
 
         if api_base:
             # Custom API base (e.g., OpenRouter)
@@ -124,13 +188,15 @@ class SafeOpenaiBackend(ListwiseRankLLM):
                     
                 if headers:
                     client_kwargs["default_headers"] = headers
-            
-        self.client = OpenAI(**client_kwargs)
 
-    class CompletionMode(Enum):
-        UNSPECIFIED = 0
-        CHAT = 1
-        TEXT = 2
+        # One client per key, handed out round robin so concurrent calls spread
+        # across keys without mutating shared state.
+        self._clients = [OpenAI(api_key=key, **client_kwargs) for key in self._keys]
+        self._key_id_cycle = itertools.cycle(
+            [(self._cur_key_id + i) % len(self._keys) for i in range(len(self._keys))]
+        )
+        self._key_id_lock = threading.Lock()
+        self.client = self._clients[self._cur_key_id]
 
     def rerank_batch(
         self,
@@ -149,9 +215,14 @@ class SafeOpenaiBackend(ListwiseRankLLM):
         populate_invocations_history: bool = kwargs.get(
             "populate_invocations_history", False
         )
-        results = []
-        for request in tqdm(requests):
-            result = self.sliding_windows(
+
+        if not requests:
+            return []
+
+        # Each request walks its own windows independently, so a slow window
+        # only delays its own request rather than every request in the batch.
+        def rerank_request(request: Request) -> Result:
+            return self.sliding_windows(
                 request,
                 rank_start=max(rank_start, 0),
                 rank_end=min(rank_end, len(request.candidates)),
@@ -161,41 +232,71 @@ class SafeOpenaiBackend(ListwiseRankLLM):
                 logging=logging,
                 populate_invocations_history=populate_invocations_history,
             )
-            results.append(result)
-        return results
 
-    def _call_completion(
+        max_workers = min(len(requests), self._max_concurrent_requests)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(
+                tqdm(executor.map(rerank_request, requests), total=len(requests))
+            )
+
+    def _next_client(self) -> OpenAI:
+        with self._key_id_lock:
+            key_id = next(self._key_id_cycle)
+        return self._clients[key_id]
+
+    def _call_chat(
+        self, *args, return_text=False, **kwargs
+    ) -> Union[str, Dict[str, Any]]:
+        return self._call_with_retries(
+            lambda client: client.chat.completions.create(
+                *args, **{**kwargs, "timeout": 30}
+            ),
+            (lambda completion: completion.choices[0].message.content)
+            if return_text
+            else None,
+        )
+
+    def _call_text(
+        self, *args, return_text=False, **kwargs
+    ) -> Union[str, Dict[str, Any]]:
+        return self._call_with_retries(
+            lambda client: client.completions.create(*args, **kwargs),
+            (lambda completion: completion.choices[0].text) if return_text else None,
+        )
+
+    def _call_with_retries(
         self,
-        *args,
-        completion_mode: CompletionMode,
-        return_text=False,
-        reduce_length=False,
-        **kwargs,
+        create_completion: Callable[[OpenAI], Any],
+        extract_text: Optional[Callable[[Any], str]] = None,
     ) -> Union[str, Dict[str, Any]]:
-        for i in range(3): # Retry up to 3 times
+        last_error = None
+        empty_completion = None
+        for attempt in range(_MAX_RETRIES):
+            delay = min(_BACKOFF_CAP, _BACKOFF_BASE * 2**attempt) + random.uniform(
+                0, _BACKOFF_JITTER
+            )
             try:
-                if completion_mode == self.CompletionMode.CHAT:
-                    completion_kwargs = {**kwargs, "timeout": 30}
-                    completion = self.client.chat.completions.create(
-                        *args, **completion_kwargs
-                    )
-                elif completion_mode == self.CompletionMode.TEXT:
-                    completion = self.client.completions.create(*args, **kwargs)
-                else:
-                    raise ValueError(
-                        "Unsupported completion mode: %V" % completion_mode
-                    )
-                if return_text:
-                    completion = (
-                        completion.choices[0].message.content
-                        if completion_mode == self.CompletionMode.CHAT
-                        else completion.choices[0].text
-                    )
-                    # if completion has 0 length, retry request
-                    if len(completion) == 0:
-                        print("Empty completion, retrying...")
-                        raise Exception("Empty completion")
-                break
+                completion = create_completion(self._next_client())
+                if extract_text is None:
+                    return completion
+                completion = extract_text(completion)
+                if completion:
+                    return completion
+                # if completion has 0 length, retry request
+                print("Empty completion, retrying...")
+                empty_completion = completion
+            except openai.RateLimitError as e:
+                print(f"Rate limited, retrying: {e}")
+                last_error = e
+                retry_after = e.response.headers.get("retry-after")
+                try:
+                    delay = min(max(float(retry_after), 0.0), _MAX_RETRY_AFTER)
+                except (TypeError, ValueError):
+                    pass
+            except (openai.APIConnectionError, openai.InternalServerError) as e:
+                # APIConnectionError also covers APITimeoutError
+                print(f"Transient error in completion call, retrying: {e}")
+                last_error = e
             except Exception as e:
                 print("Error in completion call")
                 print(str(e))
@@ -205,8 +306,15 @@ class SafeOpenaiBackend(ListwiseRankLLM):
                 if "The response was filtered" in str(e):
                     print("The response was filtered")
                     return "ERROR::The response was filtered"
-                time.sleep(0.1)
-        return completion
+                raise
+            if attempt < _MAX_RETRIES - 1:
+                time.sleep(delay)
+        if empty_completion is not None:
+            # The model did answer, an empty permutation keeps the window's order
+            return empty_completion
+        raise RuntimeError(
+            f"Completion call failed after {_MAX_RETRIES} attempts"
+        ) from last_error
 
     def run_llm(
         self,
@@ -214,55 +322,64 @@ class SafeOpenaiBackend(ListwiseRankLLM):
         current_window_size: Optional[int] = None,
     ) -> Tuple[str, int]:
         model_key = "model"
-        response = self._call_completion(
+        response = self._call_chat(
             messages=prompt,
             temperature=0,
-            completion_mode=SafeOpenaiBackend.CompletionMode.CHAT,
             return_text=True,
             **{model_key: self._model},
         )
-        try:
-            encoding = tiktoken.get_encoding(self._model)
-        except:
-            encoding = tiktoken.get_encoding("cl100k_base")
-        return response, len(encoding.encode(response))
+        return response, len(self._encoding.encode(response))
+
+    def _estimate_output_tokens(self, window_size: int) -> int:
+        return (
+            len(
+                self._encoding.encode(
+                    " > ".join([f"[{i+1}]" for i in range(window_size)])
+                )
+            )
+            - 1
+        )
 
     def num_output_tokens(self, current_window_size: Optional[int] = None) -> int:
         if current_window_size is None:
             current_window_size = self._window_size
-        if self._output_token_estimate and self._window_size == current_window_size:
-            return self._output_token_estimate
-        else:
-            try:
-                encoder = tiktoken.get_encoding(self._model)
-            except:
-                encoder = tiktoken.get_encoding("cl100k_base")
-
-            _output_token_estimate = (
-                len(
-                    encoder.encode(
-                        " > ".join([f"[{i+1}]" for i in range(current_window_size)])
-                    )
-                )
-                - 1
-            )
-            if (
-                self._output_token_estimate is None
-                and self._window_size == current_window_size
-            ):
-                self._output_token_estimate = _output_token_estimate
-            return _output_token_estimate
+        output_tokens = self._output_token_table.get(current_window_size)
+        if output_tokens is None:
+            output_tokens = self._estimate_output_tokens(current_window_size)
+        return output_tokens
 
-    def create_prompt_batched(self):
-        pass
+    def create_prompt_batched(
+        self,
+        results: List[Result],
+        rank_start: int,
+        rank_end: int,
+        batch_size: int = 32,
+    ) -> List[Tuple[List[Dict[str, str]], int]]:
+        return [self.create_prompt(result, rank_start, rank_end) for result in results]
 
-    def run_llm_batched(self):
-        pass
+    def run_llm_batched(
+        self,
+        prompts: List[Union[str, List[Dict[str, str]]]],
+        current_window_size: Optional[int] = None,
+    ) -> List[Tuple[str, int]]:
+        if not prompts:
+            return []
+        # Completions are network bound, so overlap the round trips in threads.
+        with ThreadPoolExecutor(
+            max_workers=min(len(prompts), self._max_concurrent_requests)
+        ) as executor:
+            return list(
+                executor.map(
+                    lambda prompt: self.run_llm(prompt, current_window_size), prompts
+                )
+            )
 
     def create_prompt(
         self, result: Result, rank_start: int, rank_end: int
     ) -> Tuple[List[Dict[str, str]], int]:
-        max_length = 300 * (self._window_size // (rank_end - rank_start))
+        num_candidates = rank_end - rank_start
+        max_length = 300 * (self._window_size // num_candidates)
+        max_prompt_tokens = self.max_tokens() - self.num_output_tokens()
 
         while True:
             prompt = self._inference_handler.generate_prompt(
@@ -274,48 +391,54 @@ class SafeOpenaiBackend(ListwiseRankLLM):
                 fewshot_examples=self._examples,
             )
             num_tokens = self.get_num_tokens(prompt)
-            if num_tokens <= self.max_tokens() - self.num_output_tokens():
+            # Once passages are empty there is nothing left to trim
+            if num_tokens <= max_prompt_tokens or max_length == 0:
                 break
-            else:
-                max_length -= max(
-                    1,
-                    (num_tokens - self.max_tokens() + self.num_output_tokens())
-                    // ((rank_end - rank_start) * 4),
-                )
+            # Every passage loses the same number of words and each word is at least
+            # one token, so spreading the overage evenly converges in one or two passes.
+            max_length = max(
+                0,
+                max_length
+                - max(1, math.ceil((num_tokens - max_prompt_tokens) / num_candidates)),
+            )
 
         return prompt, num_tokens
 
     def get_num_tokens(self, prompt: Union[str, List[Dict[str, str]]]) -> int:
         """Returns the number of tokens used by a list of messages in prompt."""
-        if self._model in ["gpt-3.5-turbo-0301", "gpt-3.5-turbo"]:
-            tokens_per_message = (
-                4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
-            )
-            tokens_per_name = -1  # if there's a name, the role is omitted
-        elif self._model in ["gpt-4-0314", "gpt-4"]:
-            tokens_per_message = 3
-            tokens_per_name = 1
-        else:
-            tokens_per_message, tokens_per_name = 0, 0
-
-        try:
-            encoding = tiktoken.get_encoding(self._model)
-        except:
-            encoding = tiktoken.get_encoding("cl100k_base")
-
         num_tokens = 0
         if isinstance(prompt, list):
-            for message in prompt:
-                num_tokens += tokens_per_message
-                for key, value in message.items():
-                    num_tokens += len(encoding.encode(value))
-                    if key == "name":
-                        num_tokens += tokens_per_name
+            if self._message_overhead is None:
+                values = [value for message in prompt for value in message.values()]
+            else:
+                tokens_per_message, tokens_per_name = self._message_overhead
+                values = []
+                for message in prompt:
+                    num_tokens += tokens_per_message
+                    for key, value in message.items():
+                        values.append(value)
+                        if key == "name":
+                            num_tokens += tokens_per_name
+            num_tokens += self._count_tokens(values)
         else:
-            num_tokens += len(encoding.encode(prompt))
+            num_tokens += len(self._encoding.encode(prompt))
         num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
         return num_tokens
 
+    def _count_tokens(self, values: List[str]) -> int:
+        counts = {value: self._token_count_cache.get(value) for value in values}
+        misses = [value for value, count in counts.items() if count is None]
+        if misses:
+            if len(self._token_count_cache) >= _TOKEN_COUNT_CACHE_SIZE:
+                self._token_count_cache.clear()
+            if len(misses) >= _ENCODE_BATCH_MIN_SIZE:
+                encoded = self._encoding.encode_batch(misses, num_threads=4)
+            else:
+                encoded = [self._encoding.encode(value) for value in misses]
+            for value, tokens in zip(misses, encoded):
+                counts[value] = self._token_count_cache[value] = len(tokens)
+        return sum(counts[value] for value in values)
+
     def cost_per_1k_token(self, input_token: bool) -> float:
         # TODO
         return 0
@@ -108,7 +108,7 @@ class DuoT5(PairwiseRankLLM):
         reserved_for_output = (
             64  # might need to change depending on what the actual output look like
         )
-        query_tokens = self.get_num_tokens(
+        query_tokens = self.get_num_tokens_cached(
             f"Query: {query} Document0:  Document1:  Relevant: "
         )
 
@@ -116,7 +116,7 @@ class DuoT5(PairwiseRankLLM):
             num_examples=self._num_few_shot_examples,
             examples=self._examples,
         )
-        few_shot_tokens = self.get_num_tokens(few_shot_prompt)
+        few_shot_tokens = self.get_num_tokens_cached(few_shot_prompt)
 
         max_token = (
             self._context_size - reserved_for_output - query_tokens - few_shot_tokens
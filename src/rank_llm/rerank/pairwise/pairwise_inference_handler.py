@@ -1,11 +1,13 @@
 import re
-from typing import Any, Dict, List
-
-from transformers import T5Tokenizer
+from typing import TYPE_CHECKING, Any, Dict, List
 
 from rank_llm.data import Result, TemplateSectionConfig
 from rank_llm.rerank.inference_handler import BaseInferenceHandler
 
+if TYPE_CHECKING:
+    # Only annotates the tokenizer argument, importing it at runtime loads torch
+    from transformers import T5Tokenizer
+
 
 class PairwiseInferenceHandler(BaseInferenceHandler):
     def __init__(self, template: Dict[str, str]):
@@ -96,7 +98,7 @@ class PairwiseInferenceHandler(BaseInferenceHandler):
         index1: int,
         index2: int,
         single_doc_max_token: int,
-        tokenizer: T5Tokenizer,
+        tokenizer: "T5Tokenizer",
     ) -> str:
         doc1_raw = self._convert_doc_to_prompt_content(
             result.candidates[index1].doc, max_length=single_doc_max_token
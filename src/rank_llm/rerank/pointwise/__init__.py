@@ -1,3 +1,20 @@
-from .monot5 import MonoT5
+import importlib
+
+# Backends pull in torch, vLLM or API clients, so each one is only imported the
+# first time it is accessed
+_LAZY_IMPORTS = {"MonoT5": ".monot5"}
 
 __all__ = ["MonoT5"]
+
+
+def __getattr__(name):
+    module = _LAZY_IMPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
@@ -97,12 +97,14 @@ class MonoT5(PointwiseRankLLM):
         reserved_for_output = (
             64  # might need to change depending on what the actual output look like
         )
-        query_tokens = self.get_num_tokens(f"Query: {query} Document:  Relevant: ")
+        query_tokens = self.get_num_tokens_cached(
+            f"Query: {query} Document:  Relevant: "
+        )
 
         few_shot_section = self._inference_handler._generate_fewshot_prompt(
             num_examples=self._num_few_shot_examples, examples=self._examples
         )
-        few_shot_tokens = self.get_num_tokens(few_shot_section)
+        few_shot_tokens = self.get_num_tokens_cached(few_shot_section)
 
         max_doc_tokens = (
             self._context_size - few_shot_tokens - query_tokens - reserved_for_output
@@ -1,11 +1,13 @@
 import re
-from typing import Any, Dict, List
-
-from transformers import T5Tokenizer
+from typing import TYPE_CHECKING, Any, Dict, List
 
 from rank_llm.data import Result, TemplateSectionConfig
 from rank_llm.rerank.inference_handler import BaseInferenceHandler
 
+if TYPE_CHECKING:
+    # Only annotates the tokenizer argument, importing it at runtime loads torch
+    from transformers import T5Tokenizer
+
 
 class PointwiseInferenceHandler(BaseInferenceHandler):
     def __init__(self, template: Dict[str, str]):
@@ -86,7 +88,7 @@ class PointwiseInferenceHandler(BaseInferenceHandler):
         result: Result,
         index: int,
         max_doc_tokens: int,
-        tokenizer: T5Tokenizer,
+        tokenizer: "T5Tokenizer",
     ) -> str:
         query = self._replace_number(result.query.text)
         doc_raw = self._convert_doc_to_prompt_content(
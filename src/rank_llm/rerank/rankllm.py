@@ -1,17 +1,196 @@
 import json
 import logging
+import mmap
 import os
+import pickle
+import sys
+import tempfile
+import threading
+import types
+import warnings
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
 
 import yaml
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from rank_llm.data import Request, Result
 from rank_llm.rerank.inference_handler import BaseInferenceHandler
 
 logger = logging.getLogger(__name__)
 
+# Parse prompt templates with the libyaml bindings when PyYAML was built with them
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+    logger.warning(
+        "PyYAML was built without libyaml, falling back to the slower pure-Python "
+        "SafeLoader for prompt templates."
+    )
+
+
+# Set to "1" to always parse prompt templates instead of using their pickled copies
+_DISABLE_YAML_CACHE_ENV = "RANK_LLM_DISABLE_YAML_CACHE"
+
+# First token of the header line that precedes the pickle in a template's cache file
+_TEMPLATE_CACHE_MAGIC = "rank_llm-template-v1"
+
+# Few-shot files at least this large are memory-mapped rather than read when
+# orjson is available, smaller ones are cheaper to read in one go
+_MMAP_MIN_FEW_SHOT_SIZE = 64 * 1024
+
+# Upper bound on parsed templates, and separately on few-shot files, kept in
+# the process-wide file caches
+_FILE_CACHE_SIZE = 32
+
+# Upper bound on prompts memoized by each RankLLM's get_num_tokens_cached, kept
+# small since the keys are whole prompts
+_NUM_TOKENS_CACHE_SIZE = 256
+
+
+def _parse_template(path: str) -> Dict[str, Any]:
+    # Both loaders decode UTF-8 byte streams themselves
+    with open(path, "rb") as file:
+        return yaml.load(file, Loader=_YamlLoader)
+
+
+def _file_cache_key(path: str) -> Tuple[str, int, int]:
+    # Identifies the exact revision of a file. Size as well as mtime, since
+    # cp -p, rsync and tar preserve the mtime of the files they copy.
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+def _template_cache_header(path: str) -> bytes:
+    # Ties a pickled copy to the exact template it was made from
+    _, mtime_ns, size = _file_cache_key(path)
+    return f"{_TEMPLATE_CACHE_MAGIC} {mtime_ns} {size}\n".encode()
+
+
+def _is_trusted_cache_file(file) -> bool:
+    # Only unpickle copies this user wrote and nobody else can modify
+    if not hasattr(os, "getuid"):
+        return True
+    stat = os.fstat(file.fileno())
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+def _load_template(path: str) -> Dict[str, Any]:
+    """
+    Loads a YAML prompt template, reusing a pickled copy stored next to it
+    (``<path>.pkl``) only if that copy was made from a template with exactly
+    the same mtime and size.
+    """
+    if os.environ.get(_DISABLE_YAML_CACHE_ENV) == "1":
+        return _parse_template(path)
+
+    cache_path = f"{path}.pkl"
+    header = _template_cache_header(path)
+    try:
+        with open(cache_path, "rb") as file:
+            if _is_trusted_cache_file(file) and file.readline() == header:
+                return pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+
+    data = _parse_template(path)
+    # Write to a temporary file first so concurrent readers never see a partial pickle
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(cache_path) or ".", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(header)
+                pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    except OSError:
+        # The template directory may be read-only, the cache is only an optimization
+        pass
+    return data
+
+
+def _load_few_shot(path: str) -> Tuple[Mapping[str, Any], ...]:
+    with open(path, "rb") as json_file:
+        if (
+            orjson is not None
+            and os.fstat(json_file.fileno()).st_size >= _MMAP_MIN_FEW_SHOT_SIZE
+        ):
+            # Parse straight from the mapped pages instead of a bytes copy
+            with mmap.mmap(json_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    examples = orjson.loads(view)
+        else:
+            data = json_file.read()
+            examples = orjson.loads(data) if orjson is not None else json.loads(data)
+    # Frozen so every RankLLM can share the same examples without copying them
+    return tuple(types.MappingProxyType(example) for example in examples)
+
+
+class _FileCache:
+    """
+    Process-wide LRU of values parsed from files, keyed by _file_cache_key so
+    edits are picked up without restarting the process. Values are shared by
+    every RankLLM built from the same file, so they must be treated as
+    read-only. Unlike an lru_cache, load_templates can insert the results of
+    its worker processes.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self._maxsize = maxsize
+        self._values: OrderedDict[Tuple[str, int, int], Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, int, int]) -> Optional[Any]:
+        with self._lock:
+            value = self._values.get(key)
+            if value is not None:
+                self._values.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple[str, int, int], value: Any) -> None:
+        with self._lock:
+            self._values[key] = value
+            self._values.move_to_end(key)
+            while len(self._values) > self._maxsize:
+                self._values.popitem(last=False)
+
+    def load(self, path: str, loader: Callable[[str], Any]) -> Any:
+        key = _file_cache_key(path)
+        value = self.get(key)
+        if value is None:
+            value = loader(path)
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+_template_cache = _FileCache(_FILE_CACHE_SIZE)
+_few_shot_cache = _FileCache(_FILE_CACHE_SIZE)
+
+
+def _load_template_cached(path: str) -> Dict[str, Any]:
+    return _template_cache.load(path, _load_template)
+
+
+def _load_few_shot_cached(path: str) -> Tuple[Mapping[str, Any], ...]:
+    return _few_shot_cache.load(path, _load_few_shot)
+
 
 # TODO(issue #236): Need to remove this after all the inference handlers are added
 class PromptMode(Enum):
@@ -28,6 +207,19 @@ class PromptMode(Enum):
 
 
 class RankLLM(ABC):
+    # Attributes set by RankLLM itself. Subclasses that do not declare their own
+    # __slots__ still get a __dict__ for the attributes they add.
+    __slots__ = (
+        "_model",
+        "_context_size",
+        "_prompt_mode",
+        "_num_few_shot_examples",
+        "_few_shot_file",
+        "_inference_handler",
+        "_examples",
+        "_num_tokens_cache",
+    )
+
     def __init__(
         self,
         model: str,
@@ -39,37 +231,94 @@ class RankLLM(ABC):
     ) -> None:
         self._model = model
         self._context_size = context_size
+        self._num_tokens_cache: Dict[Any, int] = {}
         self._prompt_mode = prompt_mode
         self._num_few_shot_examples = num_few_shot_examples
         self._few_shot_file = few_shot_file
 
+        # Reject a missing few-shot file before spending time on the template
+        if self._num_few_shot_examples > 0:
+            if not few_shot_file:
+                raise ValueError(
+                    "few_shot_examples_file must be provided when num_few_shot_examples > 0"
+                )
+            if not os.path.exists(few_shot_file):
+                raise ValueError(f"Few-shot examples file not found: {few_shot_file}")
+
         if prompt_mode:
-            print(
-                "PromptMode is deprecated and will be removed in v0.30.0. Please use the prompt_template_path argument with a valid template file instead."
+            warnings.warn(
+                "PromptMode is deprecated and will be removed in v0.30.0. Please use the prompt_template_path argument with a valid template file instead.",
+                FutureWarning,
+                stacklevel=self._constructor_stacklevel(),
             )
 
+        if prompt_template_path is None:
+            raise TypeError("prompt_template_path is required")
+        # Ints would otherwise be taken as file descriptors by os.stat and open
+        if not isinstance(prompt_template_path, (str, os.PathLike)):
+            raise TypeError(
+                f"Expected str or PathLike, got {type(prompt_template_path)}"
+            )
         try:
-            if not isinstance(prompt_template_path, (str, os.PathLike)):
-                raise TypeError(
-                    f"Expected str or PathLike, got {type(prompt_template_path)}"
-                )
-            print(f"Using prompt template: {prompt_template_path}")
-            with open(prompt_template_path, "r") as file:
-                data = yaml.safe_load(file)
+            logger.info("Using prompt template: %s", prompt_template_path)
+            data = _load_template_cached(prompt_template_path)
 
-                self._inference_handler = self._create_handler(data)
-                print(f"Successfully created {data['method']} inference handler!")
-        except FileNotFoundError:
+            self._inference_handler = self._create_handler(data)
+            logger.info("Successfully created %s inference handler!", data["method"])
+        except OSError:
             raise ValueError("Prompt template file missing or not found")
 
         if self._num_few_shot_examples > 0:
-            if not few_shot_file:
-                raise ValueError(
-                    "few_shot_examples_file must be provided when num_few_shot_examples > 0"
-                )
             self._load_few_shot_examples(few_shot_file)
         else:
-            self._examples = []
+            self._examples = ()
+
+    def _constructor_stacklevel(self) -> int:
+        """
+        Returns the warnings stacklevel of the code that constructed self, skipping
+        the subclass __init__ frames that chained up to RankLLM.__init__.
+        """
+        # Frame 0 is this method and frame 1 is RankLLM.__init__
+        frame = sys._getframe(2)
+        stacklevel = 2
+        while (
+            frame is not None
+            and frame.f_code.co_name == "__init__"
+            and frame.f_locals.get("self") is self
+        ):
+            frame = frame.f_back
+            stacklevel += 1
+        return stacklevel
+
+    @classmethod
+    def load_templates(cls, paths: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Loads several prompt templates at once, parsing the ones missing from the
+        process-wide template cache in parallel worker processes.
+
+        Args:
+            paths (List[str]): The paths of the YAML prompt templates to load.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: The parsed templates keyed by their path.
+        """
+        keys = {path: _file_cache_key(path) for path in paths}
+        templates = {path: _template_cache.get(key) for path, key in keys.items()}
+        misses = [path for path, template in templates.items() if template is None]
+
+        if len(misses) <= 1:
+            loaded = [_load_template(path) for path in misses]
+        else:
+            # Workers also refresh each template's pickled copy, so later
+            # constructions in any process skip the YAML parse
+            max_workers = min(len(misses), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                loaded = list(executor.map(_load_template, misses))
+
+        for path, template in zip(misses, loaded):
+            _template_cache.put(keys[path], template)
+            templates[path] = template
+        return templates
 
     @abstractmethod
     def run_llm_batched(
@@ -148,6 +397,29 @@ class RankLLM(ABC):
         """
         pass
 
+    def get_num_tokens_cached(self, prompt: Union[str, List[Dict[str, str]]]) -> int:
+        """
+        Memoized version of get_num_tokens for prompts that are counted repeatedly,
+        such as the few-shot section shared by every candidate of a query.
+
+        Args:
+            prompt (Union[str, List[Dict[str, str]]]): The prompt for which to compute the token count for.
+
+        Returns:
+            int: The number of tokens in the given prompt.
+        """
+        key = (
+            prompt
+            if isinstance(prompt, str)
+            else tuple(tuple(message.items()) for message in prompt)
+        )
+        num_tokens = self._num_tokens_cache.get(key)
+        if num_tokens is None:
+            if len(self._num_tokens_cache) >= _NUM_TOKENS_CACHE_SIZE:
+                self._num_tokens_cache.clear()
+            num_tokens = self._num_tokens_cache[key] = self.get_num_tokens(prompt)
+        return num_tokens
+
     @abstractmethod
     def cost_per_1k_token(self, input_token: bool) -> float:
         """
@@ -217,45 +489,48 @@ class RankLLM(ABC):
 
     def _create_handler(self, template: Dict[str, str]) -> BaseInferenceHandler:
         # TODO(issue #236 and #237): Need to modify function to select correct inference handler
-        from rank_llm.rerank.listwise.multiturn_listwise_inference_handler import (
-            MultiTurnListwiseInferenceHandler,
-        )
-        from rank_llm.rerank.listwise.rankfid_inference_handler import (
-            RankFIDInferenceHandler,
-        )
-        from rank_llm.rerank.listwise.singleturn_listwise_inference_handler import (
-            SingleTurnListwiseInferenceHandler,
-        )
-        from rank_llm.rerank.pairwise.pairwise_inference_handler import (
-            PairwiseInferenceHandler,
-        )
-        from rank_llm.rerank.pointwise.pointwise_inference_handler import (
-            PointwiseInferenceHandler,
-        )
-
-        try:
-            if template["method"] == "singleturn_listwise":
-                return SingleTurnListwiseInferenceHandler(template)
-            elif template["method"] == "multiturn_listwise":
-                return MultiTurnListwiseInferenceHandler(template)
-            elif template["method"] == "rankfid":
-                return RankFIDInferenceHandler(template)
-            elif template["method"] == "pointwise":
-                return PointwiseInferenceHandler(template)
-            elif template["method"] == "pairwise":
-                return PairwiseInferenceHandler(template)
-            else:
-                raise ValueError("Invalid template method")
-        except:
+        method = template.get("method")
+        if method is None:
             raise ValueError("Please provide a method section in the template")
+        try:
+            handler_cls = _HANDLER_REGISTRY[method]
+        except KeyError:
+            raise ValueError(
+                f"Invalid template method: {method!r}. Valid: {list(_HANDLER_REGISTRY)}"
+            )
+        return handler_cls(template)
 
     def _load_few_shot_examples(self, file_path: str):
         try:
-            with open(file_path, "r") as json_file:
-                self._examples = json.load(json_file)
+            self._examples = _load_few_shot_cached(file_path)
         except FileNotFoundError:
             raise ValueError(f"Few-shot examples file not found: {file_path}")
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError
         except json.JSONDecodeError:
             raise ValueError(
                 f"Invalid JSON format in few-shot examples file: {file_path}"
             )
+
+
+# The handler packages import RankLLM, so their handlers can only be imported
+# once it is defined. rank_llm.rerank loads all of them at import time anyway.
+from rank_llm.rerank.listwise.multiturn_listwise_inference_handler import (
+    MultiTurnListwiseInferenceHandler,
+)
+from rank_llm.rerank.listwise.rankfid_inference_handler import RankFIDInferenceHandler
+from rank_llm.rerank.listwise.singleturn_listwise_inference_handler import (
+    SingleTurnListwiseInferenceHandler,
+)
+from rank_llm.rerank.pairwise.pairwise_inference_handler import PairwiseInferenceHandler
+from rank_llm.rerank.pointwise.pointwise_inference_handler import (
+    PointwiseInferenceHandler,
+)
+
+# Inference handler classes keyed by the "method" section of a prompt template
+_HANDLER_REGISTRY: Dict[str, type] = {
+    "singleturn_listwise": SingleTurnListwiseInferenceHandler,
+    "multiturn_listwise": MultiTurnListwiseInferenceHandler,
+    "rankfid": RankFIDInferenceHandler,
+    "pointwise": PointwiseInferenceHandler,
+    "pairwise": PairwiseInferenceHandler,
+}
@@ -8,10 +8,6 @@ from rank_llm.rerank import (
     get_genai_api_key,
     get_openai_api_key,
 )
-from rank_llm.rerank.listwise import RankListwiseOSLLM, SafeGenai, SafeOpenai
-from rank_llm.rerank.listwise.rank_fid import RankFiDDistill, RankFiDScore
-from rank_llm.rerank.pairwise.duot5 import DuoT5
-from rank_llm.rerank.pointwise.monot5 import MonoT5
 from rank_llm.rerank.rankllm import RankLLM
 
 
@@ -196,6 +192,7 @@ class Reranker:
             model_coordinator = default_model_coordinator
         elif "gpt" in model_path or use_azure_openai:
             # GPT based reranking models
+            from rank_llm.rerank.listwise import SafeOpenai
 
             keys_and_defaults = [
                 ("context_size", 4096),
@@ -227,6 +224,8 @@ class Reranker:
                 **(get_azure_openai_args() if use_azure_openai else {}),
             )
         elif "gemini" in model_path:
+            from rank_llm.rerank.listwise import SafeGenai
+
             keys_and_defaults = [
                 ("context_size", 4096),
                 (
@@ -258,6 +257,8 @@ class Reranker:
 
         elif "vicuna" in model_path or "zephyr" in model_path:
             # RankVicuna or RankZephyr model suite
+            from rank_llm.rerank.listwise import RankListwiseOSLLM
+
             print(f"Loading {model_path} ...")
 
             model_full_paths = {
@@ -282,6 +283,7 @@ class Reranker:
                 ("tensorrt_batched", False),
                 ("use_logits", False),
                 ("use_alpha", False),
+                ("enable_prefix_caching", None),
             ]
             [
                 context_size,
@@ -297,6 +299,7 @@ class Reranker:
                 tensorrt_batched,
                 use_logits,
                 use_alpha,
+                enable_prefix_caching,
             ] = extract_kwargs(keys_and_defaults, **kwargs)
 
             model_coordinator = RankListwiseOSLLM(
@@ -319,11 +322,14 @@ class Reranker:
                 tensorrt_batched=tensorrt_batched,
                 use_logits=use_logits,
                 use_alpha=use_alpha,
+                enable_prefix_caching=enable_prefix_caching,
             )
 
             print(f"Completed loading {model_path}")
         elif "monot5" in model_path:
             # using monot5
+            from rank_llm.rerank.pointwise import MonoT5
+
             print(f"Loading {model_path} ...")
 
             model_full_paths = {"monot5": "castorini/monot5-3b-msmarco-10k"}
@@ -363,6 +369,8 @@ class Reranker:
             )
         elif "duot5" in model_path:
             # using duot5
+            from rank_llm.rerank.pairwise import DuoT5
+
             print(f"Loading {model_path} ...")
 
             model_full_paths = {"duot5": "castorini/duot5-3b-msmarco-10k"}
@@ -395,6 +403,8 @@ class Reranker:
                 batch_size=batch_size,
             )
         elif "lit5-distill" in model_path.lower():
+            from rank_llm.rerank.listwise.rank_fid import RankFiDDistill
+
             keys_and_defaults = [
                 ("context_size", 150),
                 (
@@ -429,6 +439,8 @@ class Reranker:
             )
             print(f"Completed loading {model_path}")
         elif "lit5-score" in model_path.lower():
+            from rank_llm.rerank.listwise.rank_fid import RankFiDScore
+
             keys_and_defaults = [
                 ("context_size", 150),
                 (
@@ -467,6 +479,8 @@ class Reranker:
             agent = None
         else:
             # supports loading models from huggingface
+            from rank_llm.rerank.listwise import RankListwiseOSLLM
+
             print(f"Loading {model_path} ...")
             keys_and_defaults = [
                 ("context_size", 4096),
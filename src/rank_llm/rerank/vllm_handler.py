@@ -1,3 +1,4 @@
+import threading
 from typing import Any, Dict, List, Optional
 
 import vllm
@@ -14,8 +15,14 @@ class VllmHandler:
         max_logprobs: int,
         tensor_parallel_size: int,
         gpu_memory_utilization: float,
+        enable_prefix_caching: Optional[bool] = None,
         **kwargs: Any,
     ):
+        # Leave prefix caching to vLLM's own default unless asked for explicitly,
+        # vLLM turns it off by itself for models that cannot use it
+        llm_kwargs = {}
+        if enable_prefix_caching is not None:
+            llm_kwargs["enable_prefix_caching"] = enable_prefix_caching
         self._vllm = vllm.LLM(
             model=model,
             download_dir=download_dir,
@@ -23,8 +30,12 @@ class VllmHandler:
             max_logprobs=max_logprobs,
             tensor_parallel_size=tensor_parallel_size,
             gpu_memory_utilization=gpu_memory_utilization,
+            **llm_kwargs,
         )
         self._tokenizer = self._vllm.get_tokenizer()
+        # vllm.LLM.generate drives a single engine and is not safe to call from
+        # several threads at once, so concurrent callers take turns
+        self._generate_lock = threading.Lock()
 
         if "rank_vicuna" in model:
             setattr(
@@ -55,4 +66,5 @@ class VllmHandler:
             **kwargs,
         )
 
-        return self._vllm.generate(prompts, sampling_params)
+        with self._generate_lock:
+            return self._vllm.generate(prompts, sampling_params)
@@ -1,9 +1,8 @@
 import argparse
+import functools
 import os
 import sys
 
-import torch
-
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 parent = os.path.dirname(SCRIPT_DIR)
 parent = os.path.dirname(parent)
@@ -15,77 +14,32 @@ from rank_llm.retrieve_and_rerank import retrieve_and_rerank
 
 
 def main(args):
-    model_path = args.model_path
-    query = ""
-    batch_size = args.batch_size
-    use_azure_openai = args.use_azure_openai
-    context_size = args.context_size
-    top_k_candidates = args.top_k_candidates
-    top_k_rerank = top_k_candidates if args.top_k_rerank == -1 else args.top_k_rerank
-    max_queries = args.max_queries
-    dataset = args.dataset
-    num_gpus = args.num_gpus
-    retrieval_method = args.retrieval_method
-    prompt_template_path = args.prompt_template_path
-    num_few_shot_examples = args.num_few_shot_examples
-    few_shot_file = args.few_shot_file
-    shuffle_candidates = args.shuffle_candidates
-    print_prompts_responses = args.print_prompts_responses
-    num_few_shot_examples = args.num_few_shot_examples
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    variable_passages = args.variable_passages
-    retrieval_mode = RetrievalMode.DATASET
-    num_passes = args.num_passes
-    stride = args.stride
-    window_size = args.window_size
-    system_message = args.system_message
-    populate_invocations_history = args.populate_invocations_history
-    is_thinking = args.is_thinking
-    reasoning_token_budget = args.reasoning_token_budget
-    use_logits = args.use_logits
-    use_alpha = args.use_alpha
-    sglang_batched = args.sglang_batched
-    tensorrt_batched = args.tensorrt_batched
+    # Only needed to pick a device, so argument parsing does not pay for it
+    import torch
+
+    # CLI flags are named after retrieve_and_rerank's arguments, apart from
+    # --top_k_candidates, and are forwarded as is
+    kwargs = dict(vars(args))
+    kwargs["top_k_retrieve"] = kwargs.pop("top_k_candidates")
+    if kwargs["top_k_rerank"] == -1:
+        kwargs["top_k_rerank"] = kwargs["top_k_retrieve"]
 
     _ = retrieve_and_rerank(
-        model_path=model_path,
-        query=query,
-        batch_size=batch_size,
-        dataset=dataset,
-        retrieval_mode=retrieval_mode,
-        retrieval_method=retrieval_method,
-        top_k_retrieve=top_k_candidates,
-        top_k_rerank=top_k_rerank,
-        max_queries=max_queries,
-        context_size=context_size,
-        device=device,
-        num_gpus=num_gpus,
-        prompt_template_path=prompt_template_path,
-        num_few_shot_examples=num_few_shot_examples,
-        few_shot_file=few_shot_file,
-        shuffle_candidates=shuffle_candidates,
-        print_prompts_responses=print_prompts_responses,
-        use_azure_openai=use_azure_openai,
-        variable_passages=variable_passages,
-        num_passes=num_passes,
-        window_size=window_size,
-        stride=stride,
-        system_message=system_message,
-        populate_invocations_history=populate_invocations_history,
-        is_thinking=is_thinking,
-        reasoning_token_budget=reasoning_token_budget,
-        use_logits=use_logits,
-        use_alpha=use_alpha,
-        sglang_batched=sglang_batched,
-        tensorrt_batched=tensorrt_batched,
+        query="",
+        retrieval_mode=RetrievalMode.DATASET,
+        device="cuda" if torch.cuda.is_available() else "cpu",
+        **kwargs,
     )
 
 
-""" sample run:
-python src/rank_llm/scripts/run_rank_llm.py  --model_path=castorini/rank_vicuna_7b_v1  --top_k_candidates=100 --dataset=dl20  --retrieval_method=SPLADE++_EnsembleDistil_ONNX --prompt_mode=rank_GPT  --context_size=4096 --variable_passages
-"""
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
+_DATASET_HELP = f"Should be one of 1- dataset name, must be in {TOPICS.keys()},  2- a list of inline documents  3- a list of inline hits 4- filename containing retrieved results"
+
+
+@functools.cache
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Retrieve candidates for a dataset and rerank them with RankLLM."
+    )
     parser.add_argument(
         "--model_path",
         type=str,
@@ -129,7 +83,7 @@ if __name__ == "__main__":
         "--dataset",
         type=str,
         required=True,
-        help=f"Should be one of 1- dataset name, must be in {TOPICS.keys()},  2- a list of inline documents  3- a list of inline hits 4- filename containing retrieved results",
+        help=_DATASET_HELP,
     )
     parser.add_argument(
         "--num_gpus", type=int, default=1, help="the number of GPUs to use"
@@ -233,6 +187,12 @@ if __name__ == "__main__":
         action="store_true",
         help="whether to use alphabetical identifers instead of numerical. Recommended when use_logits is True",
     )
+    parser.add_argument(
+        "--enable_prefix_caching",
+        action="store_true",
+        default=None,
+        help="force vLLM to reuse KV cache blocks across windows sharing a prompt prefix, otherwise vLLM's own default applies. Not supported by vLLM's V0 engine for sliding-window models such as Mistral",
+    )
     infer_backend_group.add_argument(
         "--sglang_batched",
         action="store_true",
@@ -243,5 +203,11 @@ if __name__ == "__main__":
         action="store_true",
         help="whether to run the model in batches using tensorrtllm backend",
     )
-    args = parser.parse_args()
-    main(args)
+    return parser
+
+
+""" sample run:
+python src/rank_llm/scripts/run_rank_llm.py  --model_path=castorini/rank_vicuna_7b_v1  --top_k_candidates=100 --dataset=dl20  --retrieval_method=SPLADE++_EnsembleDistil_ONNX --prompt_mode=rank_GPT  --context_size=4096 --variable_passages
+"""
+if __name__ == "__main__":
+    main(_build_parser().parse_args())
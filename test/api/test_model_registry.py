@@ -0,0 +1,79 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from rank_llm.api.server import _ModelRegistry
+
+
+def make_model_coordinator(name):
+    model_coordinator = MagicMock()
+    model_coordinator.get_name.return_value = name
+    return model_coordinator
+
+
+class TestModelRegistry(unittest.TestCase):
+    def test_hit_does_not_wait_for_other_pinned_models(self):
+        registry = _ModelRegistry(2, make_model_coordinator("rank_zephyr"))
+        zephyr = registry.acquire("rank_zephyr", load=None)
+        gpt = registry.acquire("gpt-4o", lambda: make_model_coordinator("gpt-4o"))
+
+        # rank_zephyr is still pinned, so gpt-4o is served without any wait
+        self.assertIs(registry.acquire("gpt-4o", load=None), gpt)
+        registry.release("gpt-4o", gpt)
+        registry.release("gpt-4o", gpt)
+        registry.release("rank_zephyr", zephyr)
+
+    def test_eviction_waits_for_pinned_model(self):
+        registry = _ModelRegistry(1, make_model_coordinator("rank_zephyr"))
+        zephyr = registry.acquire("rank_zephyr", load=None)
+        loaded = threading.Event()
+
+        def load():
+            loaded.set()
+            return make_model_coordinator("rank_vicuna")
+
+        thread = threading.Thread(target=registry.acquire, args=("rank_vicuna", load))
+        thread.start()
+        # The miss cannot evict rank_zephyr while it is in use
+        self.assertFalse(loaded.wait(timeout=0.2))
+
+        registry.release("rank_zephyr", zephyr)
+        thread.join(timeout=5)
+        self.assertTrue(loaded.is_set())
+        self.assertEqual(list(registry._model_coordinators), ["rank_vicuna"])
+
+    def test_concurrent_misses_load_once(self):
+        registry = _ModelRegistry(1)
+        release_load = threading.Event()
+        load = MagicMock(
+            side_effect=lambda: release_load.wait() and make_model_coordinator("m")
+        )
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(registry.acquire("m", load)))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        release_load.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        load.assert_called_once()
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(registry._pins["m"], 3)
+
+    def test_failed_load_is_not_cached(self):
+        registry = _ModelRegistry(1)
+        with self.assertRaises(RuntimeError):
+            registry.acquire("m", MagicMock(side_effect=RuntimeError("boom")))
+
+        model_coordinator = make_model_coordinator("m")
+        self.assertIs(
+            registry.acquire("m", lambda: model_coordinator), model_coordinator
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
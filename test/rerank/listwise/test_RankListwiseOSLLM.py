@@ -425,6 +425,28 @@ class TestRankListwiseOSLLM(unittest.TestCase):
         )
         self.assertEqual(output, 22)
 
+    @patch(
+        "rank_llm.rerank.listwise.rank_listwise_os_llm.RankListwiseOSLLM.get_num_tokens"
+    )
+    def test_get_num_tokens_cached(self, mock_get_num_tokens):
+        model_coordinator = RankListwiseOSLLM(
+            model="castorini/rank_zephyr_7b_v1_full",
+            name="rank_zephyr",
+            context_size=4096,
+            prompt_template_path="src/rank_llm/rerank/prompt_templates/rank_zephyr_template.yaml",
+            num_few_shot_examples=0,
+            variable_passages=True,
+            window_size=5,
+            system_message="",
+            device="cpu",
+        )
+
+        mock_get_num_tokens.return_value = 22
+        prompt = [{"role": "user", "content": "How are you doing?"}]
+        self.assertEqual(model_coordinator.get_num_tokens_cached(prompt), 22)
+        self.assertEqual(model_coordinator.get_num_tokens_cached(list(prompt)), 22)
+        mock_get_num_tokens.assert_called_once_with(prompt)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,221 @@
+import gc
+import math
+import unittest
+import weakref
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import httpx
+import openai
+
+from rank_llm.data import Candidate, Query, Request
+from rank_llm.rerank.listwise import SafeOpenaiBackend
+from rank_llm.rerank.rankllm import PromptMode
+
+
+def make_model_coordinator(**kwargs):
+    kwargs.setdefault("keys", "OPEN_AI_API_KEY")
+    return SafeOpenaiBackend(
+        model="gpt-4o",
+        context_size=4096,
+        prompt_template_path="src/rank_llm/rerank/prompt_templates/rank_gpt_template.yaml",
+        num_few_shot_examples=0,
+        **kwargs,
+    )
+
+
+def make_request(qid, num_candidates):
+    return Request(
+        query=Query(text=f"query {qid}", qid=qid),
+        candidates=[
+            Candidate(docid=f"d{i}", score=1.0 / (i + 1), doc={"text": f"doc {i}"})
+            for i in range(num_candidates)
+        ],
+    )
+
+
+class TestSafeOpenaiBackend(unittest.TestCase):
+    @patch("rank_llm.rerank.listwise.rank_openai.SafeOpenaiBackend.run_llm")
+    def test_run_llm_batched_preserves_order(self, mock_run_llm):
+        mock_run_llm.side_effect = lambda prompt, current_window_size: (prompt, 1)
+        model_coordinator = make_model_coordinator(max_concurrent_requests=4)
+
+        prompts = [f"prompt {i}" for i in range(10)]
+        outputs = model_coordinator.run_llm_batched(prompts, current_window_size=5)
+        self.assertEqual(outputs, [(prompt, 1) for prompt in prompts])
+        self.assertEqual(model_coordinator.run_llm_batched([]), [])
+
+    @patch("rank_llm.rerank.listwise.rank_openai.SafeOpenaiBackend.run_llm")
+    @patch("rank_llm.rerank.listwise.rank_openai.SafeOpenaiBackend.create_prompt")
+    def test_rerank_batch_keeps_request_order(self, mock_create_prompt, mock_run_llm):
+        mock_create_prompt.return_value = ("prompt", 1)
+        mock_run_llm.return_value = ("[2] > [1]", 1)
+        model_coordinator = make_model_coordinator()
+
+        requests = [make_request(0, 3), make_request(1, 2), make_request(2, 3)]
+        results = model_coordinator.rerank_batch(requests, window_size=3, stride=3)
+        self.assertEqual([result.query.qid for result in results], [0, 1, 2])
+        for result in results:
+            self.assertEqual(result.candidates[0].docid, "d1")
+
+    @patch("rank_llm.rerank.listwise.rank_openai.time.sleep")
+    def test_call_chat_retries_transient_errors(self, mock_sleep):
+        model_coordinator = make_model_coordinator()
+        message = SimpleNamespace(content="[1] > [2]")
+        client = MagicMock()
+        model_coordinator._clients = [client]
+        client.chat.completions.create.side_effect = [
+            openai.APIConnectionError(request=httpx.Request("POST", "http://test")),
+            SimpleNamespace(choices=[SimpleNamespace(message=message)]),
+        ]
+
+        output = model_coordinator._call_chat(messages=[], return_text=True)
+        self.assertEqual(output, "[1] > [2]")
+        mock_sleep.assert_called_once()
+
+    @patch("rank_llm.rerank.listwise.rank_openai.time.sleep")
+    def test_call_chat_caps_retry_after(self, mock_sleep):
+        model_coordinator = make_model_coordinator()
+        message = SimpleNamespace(content="[1] > [2]")
+        client = MagicMock()
+        model_coordinator._clients = [client]
+        response = httpx.Response(
+            429,
+            headers={"retry-after": "3600"},
+            request=httpx.Request("POST", "http://test"),
+        )
+        client.chat.completions.create.side_effect = [
+            openai.RateLimitError("rate limited", response=response, body=None),
+            SimpleNamespace(choices=[SimpleNamespace(message=message)]),
+        ]
+
+        output = model_coordinator._call_chat(messages=[], return_text=True)
+        self.assertEqual(output, "[1] > [2]")
+        mock_sleep.assert_called_once_with(32.0)
+
+    @patch("rank_llm.rerank.listwise.rank_openai.time.sleep")
+    def test_call_chat_returns_empty_text_after_empty_completions(self, mock_sleep):
+        model_coordinator = make_model_coordinator()
+        message = SimpleNamespace(content="")
+        client = MagicMock()
+        model_coordinator._clients = [client]
+        client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=message)]
+        )
+
+        output = model_coordinator._call_chat(messages=[], return_text=True)
+        self.assertEqual(output, "")
+        self.assertEqual(client.chat.completions.create.call_count, 3)
+
+    @patch("rank_llm.rerank.listwise.rank_openai.time.sleep")
+    def test_call_chat_raises_after_transient_errors(self, mock_sleep):
+        model_coordinator = make_model_coordinator()
+        client = MagicMock()
+        model_coordinator._clients = [client]
+        client.chat.completions.create.side_effect = openai.APIConnectionError(
+            request=httpx.Request("POST", "http://test")
+        )
+
+        with self.assertRaises(RuntimeError):
+            model_coordinator._call_chat(messages=[], return_text=True)
+
+    @patch("rank_llm.rerank.listwise.rank_openai.time.sleep")
+    def test_call_chat_does_not_retry_other_errors(self, mock_sleep):
+        model_coordinator = make_model_coordinator()
+        client = MagicMock()
+        model_coordinator._clients = [client]
+        client.chat.completions.create.side_effect = KeyError("x")
+
+        with self.assertRaises(KeyError):
+            model_coordinator._call_chat(messages=[], return_text=True)
+        mock_sleep.assert_not_called()
+
+    def test_get_num_tokens_reuses_message_counts(self):
+        model_coordinator = make_model_coordinator()
+        prompt = [
+            {"role": "system", "content": "You are RankGPT."},
+            {"role": "user", "content": "Rank the passages for query: test."},
+        ]
+
+        num_tokens = model_coordinator.get_num_tokens(prompt)
+        self.assertIn("You are RankGPT.", model_coordinator._token_count_cache)
+        with patch.object(model_coordinator, "_encoding") as mock_encoding:
+            self.assertEqual(model_coordinator.get_num_tokens(prompt), num_tokens)
+            mock_encoding.encode.assert_not_called()
+            mock_encoding.encode_batch.assert_not_called()
+
+    def shrink_prompt(self, prompt_overhead, max_prompt_tokens=3896):
+        model_coordinator = make_model_coordinator()
+        request = make_request(0, 20)
+        max_lengths = []
+
+        def generate_prompt(max_length, **kwargs):
+            max_lengths.append(max_length)
+            return max_length
+
+        def get_num_tokens(max_length):
+            # Each of the 20 passages costs 1.3 tokens per word kept
+            return prompt_overhead + 20 * math.ceil(1.3 * max_length)
+
+        with patch.object(
+            model_coordinator._inference_handler,
+            "generate_prompt",
+            side_effect=generate_prompt,
+        ), patch.object(
+            model_coordinator, "get_num_tokens", side_effect=get_num_tokens
+        ), patch.object(
+            model_coordinator, "max_tokens", return_value=max_prompt_tokens + 200
+        ), patch.object(
+            model_coordinator, "num_output_tokens", return_value=200
+        ):
+            _, num_tokens = model_coordinator.create_prompt(request, 0, 20)
+        return max_lengths, num_tokens
+
+    def test_create_prompt_shrinks_passages_in_at_most_two_passes(self):
+        max_lengths, num_tokens = self.shrink_prompt(prompt_overhead=100)
+        self.assertEqual(max_lengths[0], 300)
+        self.assertLessEqual(len(max_lengths) - 1, 2)
+        self.assertLessEqual(num_tokens, 3896)
+        self.assertTrue(all(max_length >= 0 for max_length in max_lengths))
+
+    def test_create_prompt_stops_at_empty_passages(self):
+        max_lengths, num_tokens = self.shrink_prompt(prompt_overhead=5000)
+        self.assertEqual(max_lengths[-1], 0)
+        self.assertTrue(all(max_length >= 0 for max_length in max_lengths))
+        self.assertEqual(num_tokens, 5000)
+
+    def test_get_num_tokens_cached_does_not_keep_model_coordinator_alive(self):
+        model_coordinator = make_model_coordinator()
+        num_tokens = model_coordinator.get_num_tokens_cached("Rank the passages.")
+        self.assertEqual(
+            model_coordinator.get_num_tokens_cached("Rank the passages."), num_tokens
+        )
+
+        model_coordinator_ref = weakref.ref(model_coordinator)
+        gc.disable()
+        try:
+            del model_coordinator
+            self.assertIsNone(model_coordinator_ref())
+        finally:
+            gc.enable()
+
+    def test_prompt_mode_warns_at_caller(self):
+        with self.assertWarns(FutureWarning) as warning:
+            make_model_coordinator(prompt_mode=PromptMode.RANK_GPT)
+        self.assertEqual(warning.filename, __file__)
+
+    def test_keys_rotate_per_call(self):
+        model_coordinator = make_model_coordinator(keys=["key0", "key1", "key2"])
+        api_keys = [model_coordinator._next_client().api_key for _ in range(4)]
+        self.assertEqual(api_keys, ["key0", "key1", "key2", "key0"])
+
+        model_coordinator = make_model_coordinator(
+            keys=["key0", "key1", "key2"], key_start_id=4
+        )
+        self.assertEqual(model_coordinator.client.api_key, "key1")
+        self.assertEqual(model_coordinator._next_client().api_key, "key1")
+        self.assertEqual(model_coordinator._next_client().api_key, "key2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,255 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from rank_llm.rerank import rankllm
+
+TEMPLATE_PATH = "src/rank_llm/rerank/prompt_templates/rank_gpt_template.yaml"
+TEMPLATE_PATHS = [
+    "src/rank_llm/rerank/prompt_templates/rank_gpt_template.yaml",
+    "src/rank_llm/rerank/prompt_templates/rank_zephyr_template.yaml",
+    "src/rank_llm/rerank/prompt_templates/rank_lrl_template.yaml",
+]
+
+
+class StubRankLLM(rankllm.RankLLM):
+    pass
+
+
+# Only RankLLM.__init__ is exercised, so the abstract methods can stay unimplemented
+StubRankLLM.__abstractmethods__ = frozenset()
+
+
+class TestTemplateCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.template_path = os.path.join(self.tmp_dir.name, "template.yaml")
+        shutil.copyfile(TEMPLATE_PATH, self.template_path)
+        self.cache_path = f"{self.template_path}.pkl"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_cache_hit_skips_parsing(self):
+        template = rankllm._load_template(self.template_path)
+        self.assertTrue(os.path.exists(self.cache_path))
+
+        with patch.object(rankllm, "_parse_template") as mock_parse:
+            self.assertEqual(rankllm._load_template(self.template_path), template)
+            mock_parse.assert_not_called()
+
+    def test_stale_cache_is_reparsed_even_with_preserved_mtime(self):
+        rankllm._load_template(self.template_path)
+        stat = os.stat(self.template_path)
+
+        # Replace the template the way cp -p or rsync would, keeping its mtime
+        with open(self.template_path, "w") as file:
+            file.write("method: singleturn_listwise\nsystem_message: changed\n")
+        os.utime(self.template_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        template = rankllm._load_template(self.template_path)
+        self.assertEqual(template["system_message"], "changed")
+        with patch.object(rankllm, "_parse_template") as mock_parse:
+            self.assertEqual(rankllm._load_template(self.template_path), template)
+            mock_parse.assert_not_called()
+
+    def test_cache_writable_by_others_is_ignored(self):
+        template = rankllm._load_template(self.template_path)
+        os.chmod(self.cache_path, 0o666)
+
+        with patch.object(
+            rankllm, "_parse_template", wraps=rankllm._parse_template
+        ) as mock_parse:
+            self.assertEqual(rankllm._load_template(self.template_path), template)
+            mock_parse.assert_called_once_with(self.template_path)
+
+    def test_read_only_directory_still_loads(self):
+        with patch.object(
+            rankllm.tempfile, "mkstemp", side_effect=PermissionError("read-only")
+        ):
+            template = rankllm._load_template(self.template_path)
+        self.assertEqual(template, rankllm._parse_template(self.template_path))
+        self.assertFalse(os.path.exists(self.cache_path))
+
+    def test_disable_env_always_parses(self):
+        with patch.dict(os.environ, {rankllm._DISABLE_YAML_CACHE_ENV: "1"}):
+            with patch.object(
+                rankllm, "_parse_template", wraps=rankllm._parse_template
+            ) as mock_parse:
+                rankllm._load_template(self.template_path)
+                rankllm._load_template(self.template_path)
+                self.assertEqual(mock_parse.call_count, 2)
+        self.assertFalse(os.path.exists(self.cache_path))
+
+
+class TestSharedCaches(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.template_path = os.path.join(self.tmp_dir.name, "template.yaml")
+        shutil.copyfile(TEMPLATE_PATH, self.template_path)
+        rankllm._template_cache.clear()
+        rankllm._few_shot_cache.clear()
+
+    def tearDown(self):
+        rankllm._template_cache.clear()
+        rankllm._few_shot_cache.clear()
+        self.tmp_dir.cleanup()
+
+    def test_template_is_shared_until_modified(self):
+        template = rankllm._load_template_cached(self.template_path)
+        self.assertIs(rankllm._load_template_cached(self.template_path), template)
+
+        with open(self.template_path, "w") as file:
+            file.write("method: singleturn_listwise\nsystem_message: changed\n")
+        stat = os.stat(self.template_path)
+        os.utime(self.template_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        changed = rankllm._load_template_cached(self.template_path)
+        self.assertEqual(changed["system_message"], "changed")
+
+    def test_few_shot_examples_are_shared_and_read_only(self):
+        few_shot_path = os.path.join(self.tmp_dir.name, "few_shot.json")
+        with open(few_shot_path, "w") as file:
+            json.dump([{"conversations": [{"value": "example"}]}], file)
+
+        examples = rankllm._load_few_shot_cached(few_shot_path)
+        self.assertIs(rankllm._load_few_shot_cached(few_shot_path), examples)
+        self.assertEqual(examples[0]["conversations"], [{"value": "example"}])
+        with self.assertRaises(TypeError):
+            examples[0]["conversations"] = []
+
+    def test_copies_with_preserved_mtime_are_reloaded(self):
+        few_shot_path = os.path.join(self.tmp_dir.name, "few_shot.json")
+        with open(few_shot_path, "w") as file:
+            json.dump([{"conversations": []}], file)
+        template = rankllm._load_template_cached(self.template_path)
+        examples = rankllm._load_few_shot_cached(few_shot_path)
+
+        # Replace both files the way cp -p or rsync would, keeping their mtimes
+        for path, content in (
+            (self.template_path, "method: singleturn_listwise\n"),
+            (few_shot_path, json.dumps([{"conversations": [{"value": "new"}]}])),
+        ):
+            stat = os.stat(path)
+            with open(path, "w") as file:
+                file.write(content)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        self.assertIsNot(rankllm._load_template_cached(self.template_path), template)
+        self.assertIsNot(rankllm._load_few_shot_cached(few_shot_path), examples)
+        self.assertEqual(
+            rankllm._load_few_shot_cached(few_shot_path)[0]["conversations"],
+            [{"value": "new"}],
+        )
+
+
+class TestFewShotLoading(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_few_shot_file(self, name, num_examples):
+        examples = [
+            {"conversations": [{"value": f"example {i} " + "x" * 100}]}
+            for i in range(num_examples)
+        ]
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, "w") as file:
+            json.dump(examples, file)
+        return path, examples
+
+    @unittest.skipIf(rankllm.orjson is None, "orjson is not installed")
+    def test_large_file_is_memory_mapped(self):
+        path, examples = self.write_few_shot_file("large.json", 1000)
+        self.assertGreaterEqual(os.path.getsize(path), rankllm._MMAP_MIN_FEW_SHOT_SIZE)
+
+        with patch.object(rankllm.mmap, "mmap", wraps=rankllm.mmap.mmap) as mock_mmap:
+            loaded = rankllm._load_few_shot_cached(path)
+            mock_mmap.assert_called_once()
+        self.assertEqual([dict(example) for example in loaded], examples)
+
+    def test_small_file_is_read(self):
+        path, examples = self.write_few_shot_file("small.json", 2)
+
+        with patch.object(rankllm.mmap, "mmap") as mock_mmap:
+            loaded = rankllm._load_few_shot_cached(path)
+            mock_mmap.assert_not_called()
+        self.assertEqual([dict(example) for example in loaded], examples)
+
+
+class TestFewShotValidation(unittest.TestCase):
+    def test_missing_few_shot_file_fails_before_loading_template(self):
+        for few_shot_file in (None, "missing_few_shot_examples.json"):
+            with self.subTest(few_shot_file=few_shot_file):
+                with patch.object(rankllm, "_load_template_cached") as mock_load:
+                    with self.assertRaises(ValueError):
+                        StubRankLLM(
+                            model="model",
+                            context_size=4096,
+                            prompt_template_path=TEMPLATE_PATH,
+                            num_few_shot_examples=2,
+                            few_shot_file=few_shot_file,
+                        )
+                    mock_load.assert_not_called()
+
+
+class TestPromptTemplatePath(unittest.TestCase):
+    def test_non_path_template_is_rejected_before_loading(self):
+        for prompt_template_path in (None, 3, True):
+            with self.subTest(prompt_template_path=prompt_template_path):
+                with patch.object(rankllm, "_load_template_cached") as mock_load:
+                    with self.assertRaises(TypeError):
+                        StubRankLLM(
+                            model="model",
+                            context_size=4096,
+                            prompt_template_path=prompt_template_path,
+                        )
+                    mock_load.assert_not_called()
+
+
+class TestLoadTemplates(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for template_path in TEMPLATE_PATHS:
+            path = os.path.join(self.tmp_dir.name, os.path.basename(template_path))
+            shutil.copyfile(template_path, path)
+            self.paths.append(path)
+        rankllm._template_cache.clear()
+
+    def tearDown(self):
+        rankllm._template_cache.clear()
+        self.tmp_dir.cleanup()
+
+    @patch.object(rankllm, "ProcessPoolExecutor", ThreadPoolExecutor)
+    def test_only_uncached_templates_are_loaded(self):
+        cached = rankllm._load_template_cached(self.paths[0])
+
+        with patch.object(
+            rankllm, "_load_template", wraps=rankllm._load_template
+        ) as mock_load:
+            templates = rankllm.RankLLM.load_templates(self.paths)
+            self.assertCountEqual(
+                [call.args[0] for call in mock_load.call_args_list], self.paths[1:]
+            )
+        self.assertEqual(list(templates), self.paths)
+        self.assertIs(templates[self.paths[0]], cached)
+        for path in self.paths:
+            self.assertEqual(templates[path], rankllm._parse_template(path))
+
+        with patch.object(rankllm, "_load_template") as mock_load:
+            self.assertEqual(rankllm.RankLLM.load_templates(self.paths), templates)
+            mock_load.assert_not_called()
+            self.assertIs(
+                rankllm._load_template_cached(self.paths[2]), templates[self.paths[2]]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import subprocess
+import sys
+import unittest
+
+# Runs the script's --help in a fresh interpreter and reports which heavy
+# modules it imported along the way
+_HELP_IMPORTS = """
+import runpy
+import sys
+
+sys.argv = ["run_rank_llm.py", "--help"]
+try:
+    runpy.run_path("src/rank_llm/scripts/run_rank_llm.py", run_name="__main__")
+except SystemExit:
+    pass
+print(",".join(m for m in ("torch", "vllm", "transformers") if m in sys.modules))
+"""
+
+
+class TestRunRankLLM(unittest.TestCase):
+    def test_help_does_not_import_torch(self):
+        output = subprocess.run(
+            [sys.executable, "-c", _HELP_IMPORTS],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        self.assertIn("--model_path", output)
+        self.assertEqual(output.splitlines()[-1], "")
+
+
+if __name__ == "__main__":
+    unittest.main()